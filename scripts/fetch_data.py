@@ -5,30 +5,36 @@ Saves static JSON files for GitHub Pages dashboard.
 Runs daily via GitHub Actions.
 """
 
+import asyncio
+import hashlib
 import json
 import os
-import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from queue import Queue
+from sys import intern
+from threading import Thread
 
-try:
-    import requests
-except ImportError:
-    import subprocess, sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
-
-try:
-    import yfinance as yf
-except ImportError:
-    import subprocess, sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "yfinance"])
-    import yfinance as yf
+import aiohttp
+import orjson
+import pandas as pd
+import yfinance as yf
+from aiolimiter import AsyncLimiter
 
 API_KEY = os.environ.get("FINNHUB_API_KEY", "")
 BASE = "https://finnhub.io/api/v1"
 DATA_DIR = Path(__file__).parent.parent / "data"
 CANDLES_DIR = DATA_DIR / "candles"
+# Build outputs that are not served by the dashboard live in .cache/
+# (gitignored) so the daily `git add data/` does not commit them.
+BUILD_DIR = Path(__file__).parent.parent / ".cache"
+# Columnar candle store for offline analysis; uploaded as a workflow artifact
+CANDLES_STORE = BUILD_DIR / "candles.parquet"
+# Conditional-request cache (ETag/Last-Modified + last body per endpoint),
+# persisted between runs by actions/cache
+CACHE_DIR = BUILD_DIR / "finnhub"
+ETAGS_PATH = CACHE_DIR / "etags.json"
 
 # Major S&P 500 symbols + sectors
 SP500 = {
@@ -107,70 +113,135 @@ SP500 = {
     "PM": {"n": "Philip Morris", "s": "Consumer"},
 }
 
-RATE_LIMIT_DELAY = 1.2  # seconds between calls (safe for 60/min)
+# Stable symbol universe + flat symbol -> sector lookup
+SYMBOLS = tuple(SP500)
+N_SYM = len(SYMBOLS)
+SYM2SEC = {k: v["s"] for k, v in SP500.items()}
+
+MAX_CONCURRENCY = 8  # simultaneous in-flight Finnhub requests
+# Finnhub free tier: 60 calls/min. One token per second, so requests are
+# spaced out instead of bursting 60 at once and tripping the quota.
+RATE_LIMIT = AsyncLimiter(1, 1.0)
+SEM = asyncio.Semaphore(MAX_CONCURRENCY)
+
+
+def _cache_path(endpoint):
+    return CACHE_DIR / f"{hashlib.sha1(endpoint.encode()).hexdigest()}.json"
+
 
+def load_validators():
+    """Load cached ETag/Last-Modified validators keyed by endpoint."""
+    try:
+        with open(ETAGS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def api_call(endpoint, retries=3):
-    """Make Finnhub API call with retry logic."""
+
+def save_validators(validators):
+    with open(ETAGS_PATH, "w") as f:
+        json.dump(validators, f, separators=(",", ":"))
+
+
+async def api_call(session, endpoint, validators=None, retries=3):
+    """Make Finnhub API call with retry logic.
+
+    When a validators dict is passed, sends If-None-Match/If-Modified-Since
+    for endpoints seen before and returns the cached body on 304.
+    """
     url = f"{BASE}{endpoint}&token={API_KEY}" if "?" in endpoint else f"{BASE}{endpoint}?token={API_KEY}"
+    cache_path = _cache_path(endpoint)
+    headers = {}
+    cached = validators.get(endpoint) if validators is not None else None
+    if cached and cache_path.exists():
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+
     for attempt in range(retries):
         try:
-            resp = requests.get(url, timeout=15)
-            if resp.status_code == 429:
-                wait = 30 * (attempt + 1)
-                print(f"  Rate limited, waiting {wait}s...")
-                time.sleep(wait)
-                continue
-            if resp.status_code == 403:
-                print(f"  403 Forbidden for {endpoint}, waiting 60s...")
-                time.sleep(60)
-                continue
-            resp.raise_for_status()
-            return resp.json()
+            async with SEM, RATE_LIMIT:
+                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                    if resp.status == 304:
+                        return orjson.loads(cache_path.read_bytes())
+                    if resp.status == 429:
+                        retry_after = resp.headers.get("Retry-After", "")
+                        wait = int(retry_after) if retry_after.isdigit() else 30 * (attempt + 1)
+                        reason = "Rate limited"
+                    elif resp.status == 403:
+                        wait = 60
+                        reason = f"403 Forbidden for {endpoint}"
+                    else:
+                        resp.raise_for_status()
+                        body = await resp.read()
+                        data = orjson.loads(body)
+                        etag = resp.headers.get("ETag")
+                        modified = resp.headers.get("Last-Modified")
+                        if validators is not None and (etag or modified):
+                            cache_path.write_bytes(body)
+                            validators[endpoint] = {"etag": etag, "modified": modified}
+                        return data
         except Exception as e:
-            print(f"  Error on attempt {attempt+1}: {e}")
-            time.sleep(5)
+            wait = 5
+            reason = f"Error on attempt {attempt+1}: {e}"
+        if attempt == retries - 1:
+            print(f"  {reason}, giving up on {endpoint}")
+            break
+        # Back off outside the semaphore so other symbols keep flowing
+        print(f"  {reason}, waiting {wait}s...")
+        await asyncio.sleep(wait)
     return None
 
 
-def fetch_insider_transactions():
+async def fetch_insider_transactions():
     """Fetch insider transactions for all S&P 500 symbols."""
     print("=" * 60)
     print("Fetching insider transactions...")
     print("=" * 60)
 
     all_tx = []
-    symbols = list(SP500.keys())
 
-    for i, sym in enumerate(symbols):
-        print(f"  [{i+1}/{len(symbols)}] {sym}...", end=" ")
-        data = api_call(f"/stock/insider-transactions?symbol={sym}")
+    validators = load_validators()
+    async with aiohttp.ClientSession() as session:
+        tasks = [api_call(session, f"/stock/insider-transactions?symbol={sym}", validators) for sym in SYMBOLS]
+        results = await asyncio.gather(*tasks)
+    save_validators(validators)
+
+    # ISO dates (YYYY-MM-DD) sort lexicographically, so compare as strings
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=180)).strftime("%Y-%m-%d")
+
+    # Insider names repeat across many rows; share one string object per name
+    name_pool = {}
+
+    for i, (sym, data) in enumerate(zip(SYMBOLS, results)):
+        print(f"  [{i+1}/{N_SYM}] {sym}...", end=" ")
 
         if data and "data" in data and data["data"]:
             # Filter: only P (Purchase) and S (Sale), last 180 days
-            cutoff = datetime.datetime.now() - datetime.timedelta(days=180)
             filtered = []
             for tx in data["data"]:
                 code = (tx.get("transactionCode") or "").upper()
                 if code not in ("P", "S"):
                     continue
                 tx_date_str = tx.get("transactionDate") or tx.get("filingDate") or ""
-                try:
-                    tx_date = datetime.datetime.strptime(tx_date_str, "%Y-%m-%d")
-                except ValueError:
+                if len(tx_date_str) != 10 or tx_date_str[4] != "-" or tx_date_str[7] != "-":
                     continue
-                if tx_date < cutoff:
+                if tx_date_str < cutoff:
                     continue
                 if not tx.get("change") or tx["change"] == 0:
                     continue
 
+                name = tx.get("name", "Unknown")
+                price = tx.get("transactionPrice", 0)
                 filtered.append({
                     "sym": sym,
-                    "name": tx.get("name", "Unknown"),
+                    "name": name_pool.setdefault(name, name),
                     "title": tx.get("officerTitle", ""),
-                    "code": code,
+                    "code": intern(code),
                     "change": tx["change"],
-                    "price": tx.get("transactionPrice", 0),
+                    "price": price,
+                    "val": abs(tx["change"] * (price or 0)),
                     "share": tx.get("share", 0),
                     "txDate": tx_date_str,
                     "fileDate": tx.get("filingDate", ""),
@@ -181,8 +252,6 @@ def fetch_insider_transactions():
         else:
             print("no data")
 
-        time.sleep(RATE_LIMIT_DELAY)
-
     # Sort by date desc
     all_tx.sort(key=lambda x: x["txDate"], reverse=True)
 
@@ -190,7 +259,7 @@ def fetch_insider_transactions():
     seen = set()
     deduped = []
     for tx in all_tx:
-        key = f"{tx['name']}-{tx['txDate']}-{tx['change']}-{tx['sym']}"
+        key = (tx["name"], tx["txDate"], tx["change"], tx["sym"])
         if key not in seen:
             seen.add(key)
             deduped.append(tx)
@@ -199,120 +268,165 @@ def fetch_insider_transactions():
     return deduped
 
 
+YF_BATCH_SIZE = 20  # symbols per Yahoo download request
+
+
+def write_json(path, obj):
+    """Atomically write compact JSON."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(orjson.dumps(obj))
+    os.replace(tmp_path, path)
+
+
+def _candle_writer(queue):
+    """Drain (sym, candle) items from the queue, writing each symbol's JSON."""
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        sym, candle = item
+        try:
+            write_json(CANDLES_DIR / f"{sym}.json", candle)
+        except Exception as e:
+            print(f"  write error for {sym}: {e}")
+
+
 def fetch_candles(symbols_needed):
     """Fetch 200 days of daily candles using Yahoo Finance (free, no rate limit)."""
     print("\n" + "=" * 60)
     print("Fetching price candles via Yahoo Finance...")
     print("=" * 60)
 
-    for i, sym in enumerate(symbols_needed):
-        print(f"  [{i+1}/{len(symbols_needed)}] {sym}...", end=" ")
-        try:
-            ticker = yf.Ticker(sym)
-            df = ticker.history(period="200d", interval="1d")
-
-            if df.empty:
-                print("no data")
-                continue
-
-            # Convert to same format as before: timestamps + close prices
-            timestamps = [int(ts.timestamp()) for ts in df.index]
-            closes = [round(float(p), 2) for p in df["Close"]]
-            highs = [round(float(p), 2) for p in df["High"]]
-            lows = [round(float(p), 2) for p in df["Low"]]
-
-            candle = {
-                "t": timestamps,
-                "c": closes,
-                "h": highs,
-                "l": lows,
-            }
-
-            out_path = CANDLES_DIR / f"{sym}.json"
-            with open(out_path, "w") as f:
-                json.dump(candle, f, separators=(",", ":"))
-            print(f"{len(closes)} days")
+    # Per-symbol JSON is encoded and written on a background thread while
+    # the next batch downloads
+    write_queue = Queue()
+    writer = Thread(target=_candle_writer, args=(write_queue,), daemon=True)
+    writer.start()
 
+    frames = []
+    for start in range(0, len(symbols_needed), YF_BATCH_SIZE):
+        chunk = symbols_needed[start:start + YF_BATCH_SIZE]
+        print(f"  Batch {start // YF_BATCH_SIZE + 1}: {', '.join(chunk)}")
+        try:
+            batch = yf.download(
+                tickers=chunk, period="200d", interval="1d", group_by="ticker",
+                auto_adjust=True, ignore_tz=False, threads=True, progress=False,
+            )
         except Exception as e:
-            print(f"error: {e}")
+            print(f"  error: {e}")
+            continue
 
-        time.sleep(0.3)  # Light delay to be polite
+        for i, sym in enumerate(chunk, start + 1):
+            print(f"  [{i}/{len(symbols_needed)}] {sym}...", end=" ")
+            try:
+                if batch.columns.nlevels > 1:
+                    if sym not in batch.columns.get_level_values(0):
+                        print("no data")
+                        continue
+                    df = batch[sym]
+                else:
+                    df = batch
+                df = df.dropna(subset=["Close"])
+
+                if df.empty:
+                    print("no data")
+                    continue
+
+                df = df[["Close", "High", "Low"]].round(2)
+                frames.append(df.assign(sym=sym))
+                write_queue.put((sym, {
+                    "t": df.index.as_unit("s").asi8.tolist(),
+                    "c": df["Close"].tolist(),
+                    "h": df["High"].tolist(),
+                    "l": df["Low"].tolist(),
+                }))
+                print(f"{len(df)} days")
+
+            except Exception as e:
+                print(f"error: {e}")
+
+    write_queue.put(None)
+    writer.join()
+
+    if not frames:
+        return
+
+    # Single columnar store for all symbols (long format, one row per sym/day)
+    combined = pd.concat(frames)
+    combined.index.name = "date"
+    combined.to_parquet(CANDLES_STORE, compression="zstd")
+    print(f"  Saved {len(combined)} rows to .cache/{CANDLES_STORE.name}")
+
+
+def _top_stocks(side, n=5):
+    """Top symbols by traded value: [(sym, {total, count}), ...]."""
+    agg = side.groupby("sym", sort=False)["val"].agg(["sum", "count"]).nlargest(n, "sum")
+    return [
+        (sym, {"total": total, "count": count})
+        for sym, total, count in zip(agg.index, agg["sum"].tolist(), agg["count"].tolist())
+    ]
+
+
+def _top_insiders(side, n=5):
+    """Top insiders by traded value, each with their n largest transactions."""
+    # Group on integer codes so null names (Finnhub sometimes sends them)
+    # are ranked as their own insider instead of being dropped
+    codes, names = pd.factorize(side["name"], use_na_sentinel=False)
+    totals = side["val"].groupby(codes, sort=False).sum().nlargest(n)
+    top = []
+    for code, total in totals.items():
+        name = names[code]
+        rows = side[codes == code]
+        txs = rows.nlargest(n, "val")
+        top.append((None if pd.isna(name) else name, {
+            "total": float(total),
+            "sym": rows["sym"].iat[0],
+            "txs": [
+                {"sym": sym, "date": date, "val": val}
+                for sym, date, val in zip(txs["sym"].tolist(), txs["txDate"].tolist(), txs["val"].tolist())
+            ],
+        }))
+    return top
 
 
 def build_summary(transactions):
-    """Build summary statistics."""
-    buys = [tx for tx in transactions if tx["code"] == "P"]
-    sells = [tx for tx in transactions if tx["code"] == "S"]
-
-    buy_val = sum(abs(tx["change"] * tx["price"]) for tx in buys)
-    sell_val = sum(abs(tx["change"] * tx["price"]) for tx in sells)
-
-    # Top stocks by buy/sell volume
-    buy_stocks = {}
-    sell_stocks = {}
-    for tx in transactions:
-        val = abs(tx["change"] * tx["price"])
-        sym = tx["sym"]
-        if tx["code"] == "P":
-            buy_stocks.setdefault(sym, {"total": 0, "count": 0})
-            buy_stocks[sym]["total"] += val
-            buy_stocks[sym]["count"] += 1
-        else:
-            sell_stocks.setdefault(sym, {"total": 0, "count": 0})
-            sell_stocks[sym]["total"] += val
-            sell_stocks[sym]["count"] += 1
-
-    # Top insiders
-    buy_insiders = {}
-    sell_insiders = {}
-    for tx in transactions:
-        val = abs(tx["change"] * tx["price"])
-        name = tx["name"]
-        sym = tx["sym"]
-        if tx["code"] == "P":
-            if name not in buy_insiders or buy_insiders[name]["total"] < val + buy_insiders[name]["total"]:
-                buy_insiders.setdefault(name, {"total": 0, "sym": sym, "txs": []})
-                buy_insiders[name]["total"] += val
-                buy_insiders[name]["txs"].append({"sym": sym, "date": tx["txDate"], "val": val})
-        else:
-            sell_insiders.setdefault(name, {"total": 0, "sym": sym, "txs": []})
-            sell_insiders[name]["total"] += val
-            sell_insiders[name]["txs"].append({"sym": sym, "date": tx["txDate"], "val": val})
-
-    # Sectors
-    sectors = {}
-    for tx in transactions:
-        info = SP500.get(tx["sym"])
-        if not info:
-            continue
-        sec = info["s"]
-        sectors.setdefault(sec, {"buys": 0, "sells": 0})
-        val = abs(tx["change"] * tx["price"])
-        if tx["code"] == "P":
-            sectors[sec]["buys"] += val
-        else:
-            sectors[sec]["sells"] += val
+    """Build summary statistics with vectorized pandas aggregation."""
+    df = pd.DataFrame(transactions, columns=["sym", "name", "code", "val", "txDate"])
+    df["val"] = df["val"].astype(float)
+    df["sec"] = df["sym"].map(SYM2SEC)
+
+    is_buy = df["code"] == "P"
+    buys = df[is_buy]
+    sells = df[~is_buy]
+
+    # Buy/sell totals and counts in one grouped pass
+    totals = df.groupby("code")["val"].sum()
+    counts = df["code"].value_counts()
+
+    # Sectors: buy/sell value per sector, largest total activity first
+    sectors = (
+        df.assign(side=is_buy.map({True: "buys", False: "sells"}))
+        .groupby(["sec", "side"])["val"].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=["buys", "sells"], fill_value=0)
+    )
+    sectors = sectors.loc[(sectors["buys"] + sectors["sells"]).sort_values(ascending=False, kind="stable").index]
 
     return {
         "updated": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "buyCount": len(buys),
-        "sellCount": len(sells),
-        "buyVal": round(buy_val, 2),
-        "sellVal": round(sell_val, 2),
-        "uniqueSymbols": len(set(tx["sym"] for tx in transactions)),
-        "topBuyStocks": sorted(buy_stocks.items(), key=lambda x: -x[1]["total"])[:5],
-        "topSellStocks": sorted(sell_stocks.items(), key=lambda x: -x[1]["total"])[:5],
-        "topBuyInsiders": sorted(
-            [(k, {"total": v["total"], "sym": v["sym"], "txs": sorted(v["txs"], key=lambda t: -t["val"])[:5]})
-             for k, v in buy_insiders.items()],
-            key=lambda x: -x[1]["total"]
-        )[:5],
-        "topSellInsiders": sorted(
-            [(k, {"total": v["total"], "sym": v["sym"], "txs": sorted(v["txs"], key=lambda t: -t["val"])[:5]})
-             for k, v in sell_insiders.items()],
-            key=lambda x: -x[1]["total"]
-        )[:5],
-        "sectors": sorted(sectors.items(), key=lambda x: -(x[1]["buys"] + x[1]["sells"])),
+        "buyCount": int(counts.get("P", 0)),
+        "sellCount": int(counts.get("S", 0)),
+        "buyVal": round(float(totals.get("P", 0.0)), 2),
+        "sellVal": round(float(totals.get("S", 0.0)), 2),
+        "uniqueSymbols": int(df["sym"].nunique()),
+        "topBuyStocks": _top_stocks(buys),
+        "topSellStocks": _top_stocks(sells),
+        "topBuyInsiders": _top_insiders(buys),
+        "topSellInsiders": _top_insiders(sells),
+        "sectors": [
+            (sec, {"buys": b, "sells": s})
+            for sec, b, s in zip(sectors.index, sectors["buys"].tolist(), sectors["sells"].tolist())
+        ],
     }
 
 
@@ -324,25 +438,29 @@ def main():
     # Ensure directories exist
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     CANDLES_DIR.mkdir(parents=True, exist_ok=True)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
     # 1. Fetch insider transactions
-    transactions = fetch_insider_transactions()
+    transactions = asyncio.run(fetch_insider_transactions())
 
     # Save raw transactions
-    with open(DATA_DIR / "insider.json", "w") as f:
-        json.dump(transactions, f, separators=(",", ":"))
+    write_json(DATA_DIR / "insider.json", transactions)
     print(f"Saved {len(transactions)} transactions to data/insider.json")
 
-    # 2. Build & save summary
-    summary = build_summary(transactions)
-    with open(DATA_DIR / "summary.json", "w") as f:
-        json.dump(summary, f, indent=2)
-    print(f"Saved summary to data/summary.json")
-
-    # 3. Fetch candles for symbols with activity
+    # 2. Fetch candles for symbols with activity (Yahoo, I/O-bound) while the
+    # summary is built (pandas) on a second worker
     active_symbols = sorted(set(tx["sym"] for tx in transactions))
     print(f"\n{len(active_symbols)} symbols with insider activity: {', '.join(active_symbols[:10])}...")
-    fetch_candles(active_symbols)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        candles_job = ex.submit(fetch_candles, active_symbols)
+        summary_job = ex.submit(build_summary, transactions)
+
+        # 3. Save summary as soon as it is ready
+        summary = summary_job.result()
+        write_json(DATA_DIR / "summary.json", summary)
+        print(f"Saved summary to data/summary.json")
+
+        candles_job.result()
 
     print("\n" + "=" * 60)
     print("DONE!")
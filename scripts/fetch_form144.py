@@ -13,19 +13,8 @@ import datetime
 import re
 from pathlib import Path
 
-try:
-    import requests
-except ImportError:
-    import subprocess, sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
-
-try:
-    import yfinance as yf
-except ImportError:
-    import subprocess, sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "yfinance"])
-    import yfinance as yf
+import requests
+import yfinance as yf
 
 # ============================================================
 # CONFIG
@@ -89,12 +78,17 @@ for ticker, name in TRACKED_TICKERS.items():
 
 RATE_LIMIT_DELAY = 0.12  # SEC allows 10 req/sec
 
+# Shared session: reuses TCP/TLS connections to EDGAR across calls
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0))
+
 
 def sec_get(url, retries=3):
     """Make SEC EDGAR request with retry logic."""
     for attempt in range(retries):
         try:
-            resp = requests.get(url, headers=HEADERS, timeout=20)
+            resp = SESSION.get(url, timeout=20)
             if resp.status_code == 429:
                 wait = 15 * (attempt + 1)
                 print(f"  Rate limited, waiting {wait}s...")